@@ -15,6 +15,18 @@ def _wrn(x,
          num_outputs,
          weight_decay,
          bn_momentum=0.9):
+    """Builds a Wide Residual Network on top of the input ``x``.
+
+    All layers operate on channels-last (``NHWC``) tensors, i.e. ``x`` has to be
+    of shape ``(batch_size, height, width, channels)``. ``training`` can be a
+    ``tf.bool`` tensor or a Python bool; the latter fixes the batch norm mode
+    when the graph is built, so no ``tf.cond`` is inserted.
+    """
+    # Initializer and regularizer are shared by all layers instead of being
+    # re-created for every layer in the residual loops.
+    kernel_initializer = tf.initializers.glorot_uniform()
+    kernel_regularizer = tf.contrib.layers.l2_regularizer(weight_decay)
+
     def conv2d(inputs, filters, kernel_size, strides=1):
         """Convenience wrapper for conv layers."""
         return tf.layers.conv2d(
@@ -23,59 +35,60 @@ def _wrn(x,
             kernel_size,
             strides,
             padding="same",
+            data_format="channels_last",
             use_bias=False,
-            kernel_initializer=tf.initializers.glorot_uniform(),
-            kernel_regularizer=tf.contrib.layers.l2_regularizer(weight_decay))
+            kernel_initializer=kernel_initializer,
+            kernel_regularizer=kernel_regularizer)
 
     def batch_normalization(inputs):
-        """Convenience wrapper for batch norm."""
+        """Convenience wrapper for (fused) batch norm."""
         return tf.layers.batch_normalization(
             inputs,
             axis=-1,
             momentum=bn_momentum,
             epsilon=1e-5,
-            training=training)
+            training=training,
+            fused=True)
 
     # Number of filter channels and stride for the blocks
     filters = [
         16, 16 * widening_factor, 32 * widening_factor, 64 * widening_factor
     ]
     strides = [1, 2, 2]
+    # (input filters, output filters, stride) of the three residual blocks
+    block_specs = [(filters[i - 1], filters[i], strides[i - 1])
+                   for i in range(1, 4)]
 
     # Initial convolution layer
     x = conv2d(x, 16, 3)
 
     # Loop over three residual blocks
-    for i in range(1, 4, 1):
+    for i, (in_filters, out_filters, stride) in enumerate(block_specs, 1):
 
         # First residual unit
         with tf.variable_scope('unit_%d_0' % i):
             x = batch_normalization(x)
             x = tf.nn.relu(x)
             # Shortcut
-            if filters[i - 1] == filters[i]:
-                if strides[i - 1] == 1:
-                    shortcut = tf.identity(x)
+            if in_filters == out_filters:
+                if stride == 1:
+                    shortcut = x
                 else:
-                    shortcut = tf.layers.max_pooling2d(x, strides[i - 1],
-                                                       strides[i - 1])
-
-
-#          shortcut = tf.nn.max_pool(x, [1, strides[i - 1], strides[i - 1], 1],
-#                                    [1, strides[i - 1], strides[i - 1], 1], 'VALID')
+                    shortcut = tf.layers.max_pooling2d(
+                        x, stride, stride, data_format="channels_last")
             else:
-                shortcut = conv2d(x, filters[i], 1, strides=strides[i - 1])
+                shortcut = conv2d(x, out_filters, 1, strides=stride)
             # Residual
-            x = conv2d(x, filters[i], 3, strides[i - 1])
+            x = conv2d(x, out_filters, 3, stride)
             x = batch_normalization(x)
             x = tf.nn.relu(x)
-            x = conv2d(x, filters[i], 3, 1)
+            x = conv2d(x, out_filters, 3, 1)
 
             # Merge
             x = x + shortcut
 
         # further residual units
-        for j in range(1, num_residual_units, 1):
+        for j in range(1, num_residual_units):
             with tf.variable_scope('unit_%d_%d' % (i, j)):
                 # Shortcut
                 shortcut = x
@@ -83,10 +96,10 @@ def _wrn(x,
                 # Residual
                 x = batch_normalization(x)
                 x = tf.nn.relu(x)
-                x = conv2d(x, filters[i], 3, 1)
+                x = conv2d(x, out_filters, 3, 1)
                 x = batch_normalization(x)
                 x = tf.nn.relu(x)
-                x = conv2d(x, filters[i], 3, 1)
+                x = conv2d(x, out_filters, 3, 1)
 
                 # Merge
                 x = x + shortcut
@@ -95,7 +108,16 @@ def _wrn(x,
     with tf.variable_scope('unit_last'):
         x = batch_normalization(x)
         x = tf.nn.relu(x)
-        x = tf.reduce_mean(x, [1, 2])
+        # Global average pooling over the spatial axes of the NHWC tensor.
+        # Use a pooling layer spanning the full spatial extent if it is known
+        # statically, and fall back to a generic reduction otherwise.
+        x_shape = x.get_shape().as_list()
+        if None in x_shape[1:3]:
+            x = tf.reduce_mean(x, [1, 2])
+        else:
+            x = tf.layers.average_pooling2d(
+                x, x_shape[1:3], 1, data_format="channels_last")
+            x = tf.squeeze(x, [1, 2])
 
     # Reshaping and final fully-connected layer
     with tf.variable_scope('fully-connected'):
@@ -104,8 +126,8 @@ def _wrn(x,
         linear_outputs = tf.layers.dense(
             x,
             num_outputs,
-            kernel_initializer=tf.initializers.glorot_uniform(),
+            kernel_initializer=kernel_initializer,
             bias_initializer=tf.initializers.constant(0.0),
-            kernel_regularizer=tf.contrib.layers.l2_regularizer(weight_decay))
+            kernel_regularizer=kernel_regularizer)
 
     return linear_outputs
@@ -71,10 +71,12 @@ class cifar100_wrn404(TestProblem):
             num_outputs=100,
             weight_decay=self._weight_decay)
 
-        self.losses = tf.nn.softmax_cross_entropy_with_logits_v2(
-            labels=y, logits=linear_outputs)
-        y_pred = tf.argmax(linear_outputs, 1)
+        # The one-hot labels are converted to class indices once, which are
+        # used by both the (sparse) cross-entropy loss and the accuracy.
         y_correct = tf.argmax(y, 1)
+        self.losses = tf.nn.sparse_softmax_cross_entropy_with_logits(
+            labels=y_correct, logits=linear_outputs)
+        y_pred = tf.argmax(linear_outputs, 1)
         correct_prediction = tf.equal(y_pred, y_correct)
         self.accuracy = tf.reduce_mean(tf.cast(correct_prediction, tf.float32))
 